@@ -10,22 +10,91 @@ This server provides read-only tools for:
 Requires HATCHET_CLIENT_TOKEN environment variable to be set.
 """
 
-from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import operator
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from functools import lru_cache
 from typing import Any
 
+from async_lru import alru_cache
 from hatchet_sdk import Hatchet, V1TaskStatus
+from hatchet_sdk.clients.rest.api_client import ApiClient
 from mcp.server.fastmcp import FastMCP
 
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """
+    Warm the workflow catalog and start the cache sweeper in the background,
+    then stop them and close the shared REST connection pool on shutdown.
+    """
+    tasks = [
+        asyncio.create_task(_warm_workflow_catalog()),
+        asyncio.create_task(_cache_sweeper()),
+    ]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if get_hatchet_client.cache_info().currsize:
+            get_hatchet_client().runs.client().rest_client.pool_manager.clear()
+        get_hatchet_client.cache_clear()
+
+
 # Initialize MCP server
-mcp = FastMCP("Hatchet Debug Server")
+mcp = FastMCP("Hatchet Debug Server", lifespan=_lifespan)
+
+
+# Connections kept open to the Hatchet REST API, shared by all tool calls
+_REST_POOL_MAXSIZE = 32
 
 
 @lru_cache(maxsize=1)
 def get_hatchet_client() -> Hatchet:
-    """Lazy-load the Hatchet client to avoid initialization errors at import time."""
-    return Hatchet(debug=False)
+    """
+    Lazy-load the Hatchet client to avoid initialization errors at import time.
 
+    The SDK's REST clients build a new ApiClient, and with it a new urllib3
+    connection pool, for every request. Point them at one shared ApiClient
+    so connections are reused across tool calls.
+    """
+    hatchet = Hatchet(debug=False)
+    rest_clients = (hatchet.runs, hatchet.workflows, hatchet.metrics)
+    # These are hatchet-sdk internals (checked against 1.x); fail loudly
+    # rather than silently falling back to per-request pools if they change.
+    for rest in rest_clients:
+        if not (callable(getattr(rest, "client", None)) and hasattr(rest, "api_config")):
+            raise RuntimeError(
+                f"{type(rest).__name__} has no client()/api_config; "
+                "hatchet-sdk internals changed"
+            )
+
+    api_config = hatchet.runs.api_config
+    api_config.connection_pool_maxsize = _REST_POOL_MAXSIZE
+    api_client = ApiClient(api_config)
+    if not hasattr(getattr(api_client, "rest_client", None), "pool_manager"):
+        raise RuntimeError(
+            "ApiClient has no rest_client.pool_manager; hatchet-sdk internals changed"
+        )
+
+    for rest in rest_clients:
+        # ApiClient.__exit__ is a no-op, so the instance outlives each request
+        rest.client = lambda: api_client
+    return hatchet
+
+
+_UTC = timezone.utc
+
+# Fallback for WorkflowList.rows, which the SDK declares optional; run
+# listings always carry a rows list
+_EMPTY_ROWS: tuple[Any, ...] = ()
 
 # Map string status names to V1TaskStatus enum
 STATUS_MAP = {
@@ -37,33 +106,306 @@ STATUS_MAP = {
     "cancelled": V1TaskStatus.CANCELLED,
 }
 
+# Canonical status names reported by get_queue_metrics ("succeeded" is only an alias)
+_STATUS_NAMES = tuple(k for k in STATUS_MAP if k != "succeeded")
+
+
+@dataclass(frozen=True)
+class CachedCatalog:
+    """Workflow catalog snapshot with its name index built at fetch time."""
+
+    workflows: list[dict]
+    name_to_ids: dict[str, list[str]]
+
+
+# Workflows requested per page when fetching the catalog
+_WORKFLOW_PAGE_SIZE = 200
+
+
+@alru_cache(maxsize=1, ttl=60)
+async def _get_workflow_catalog() -> CachedCatalog:
+    """
+    Fetch the workflow catalog, cached for a short window.
+
+    Shared by list_workflows and workflow_name filters so one fetch serves
+    both. Uses alru_cache rather than functools.lru_cache, which would cache
+    the coroutine object instead of its result.
+    """
+    hatchet = get_hatchet_client()
+    rows: list[Any] = []
+    offset = 0
+    while True:
+        page = await hatchet.workflows.aio_list(limit=_WORKFLOW_PAGE_SIZE, offset=offset)
+        page_rows = page.rows or _EMPTY_ROWS
+        rows.extend(page_rows)
+        if len(page_rows) < _WORKFLOW_PAGE_SIZE:
+            break
+        offset += _WORKFLOW_PAGE_SIZE
+
+    name_to_ids: dict[str, list[str]] = {}
+    for w in rows:
+        if hasattr(w, "name"):
+            name_to_ids.setdefault(w.name, []).append(w.metadata.id)
+    return CachedCatalog(
+        workflows=[_serialize_workflow(w) for w in rows],
+        name_to_ids=name_to_ids,
+    )
+
+
+async def _warm_workflow_catalog() -> None:
+    """Fetch the workflow catalog ahead of the first workflow_name filter."""
+    try:
+        await _get_workflow_catalog()
+    except Exception:
+        # Errors resurface on the first tool call that needs the catalog
+        pass
+
+
+# Fields present on both V1TaskSummary (run listings) and V1WorkflowRun
+# (run details), fetched in one C-level call
+_RUN_GETTER = operator.attrgetter(
+    "metadata",
+    "workflow_id",
+    "status",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "additional_metadata",
+)
+_WORKFLOW_GETTER = operator.attrgetter("metadata", "name", "description")
+
 
 def _serialize_run(run: Any) -> dict:
     """Serialize a workflow run to a JSON-friendly dict."""
-    metadata = run.metadata if hasattr(run, "metadata") else {}
+    (
+        metadata,
+        workflow_id,
+        status,
+        created_at,
+        started_at,
+        finished_at,
+        additional_metadata,
+    ) = _RUN_GETTER(run)
+    # Timestamps stay as datetime objects; FastMCP's pydantic encoder
+    # formats them as ISO 8601 when the tool result is serialized.
     return {
-        "id": metadata.id if hasattr(metadata, "id") else str(run),
-        "workflow_id": run.workflow_id if hasattr(run, "workflow_id") else None,
-        "workflow_name": run.workflow_name if hasattr(run, "workflow_name") else None,
-        "status": run.status.value if hasattr(run, "status") else None,
-        "created_at": str(run.created_at) if hasattr(run, "created_at") else None,
-        "started_at": str(run.started_at) if hasattr(run, "started_at") else None,
-        "finished_at": str(run.finished_at) if hasattr(run, "finished_at") else None,
-        "additional_metadata": run.additional_metadata if hasattr(run, "additional_metadata") else {},
+        "id": metadata.id,
+        "workflow_id": workflow_id,
+        # Only task summaries carry the workflow name
+        "workflow_name": getattr(run, "workflow_name", None),
+        "status": status.value,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "additional_metadata": additional_metadata if additional_metadata is not None else {},
     }
 
 
 def _serialize_workflow(workflow: Any) -> dict:
     """Serialize a workflow to a JSON-friendly dict."""
-    metadata = workflow.metadata if hasattr(workflow, "metadata") else {}
+    metadata, name, description = _WORKFLOW_GETTER(workflow)
     return {
-        "id": metadata.id if hasattr(metadata, "id") else str(workflow),
-        "name": workflow.name if hasattr(workflow, "name") else None,
-        "description": workflow.description if hasattr(workflow, "description") else None,
-        "version": workflow.version if hasattr(workflow, "version") else None,
+        "id": metadata.id,
+        "name": name,
+        "description": description,
+        # Workflow has no version field; kept so the response shape is unchanged
+        "version": getattr(workflow, "version", None),
     }
 
 
+async def _build_params(
+    *,
+    since_hours: int,
+    limit: int | None = None,
+    status: str | None = None,
+    workflow_name: str | None = None,
+    metadata: dict[str, str] | None = None,
+) -> dict[str, Any] | None:
+    """
+    Build the shared filter parameters for hatchet.runs.aio_list.
+
+    Returns None when workflow_name matches no workflow in the cached catalog,
+    so callers can skip the query instead of listing runs without the workflow
+    filter. Workflows registered since the catalog was fetched show up after
+    its TTL, the periodic sweep, or refresh_cache.
+    """
+    params: dict[str, Any] = {
+        "since": datetime.fromtimestamp(time.time() - since_hours * 3600, tz=_UTC),
+    }
+    if limit is not None:
+        params["limit"] = limit
+    if metadata:
+        params["additional_metadata"] = metadata
+
+    status_enum = STATUS_MAP.get(status.lower()) if status else None
+    if status_enum:
+        params["statuses"] = [status_enum]
+
+    if workflow_name:
+        workflow_ids = (await _get_workflow_catalog()).name_to_ids.get(workflow_name)
+        if not workflow_ids:
+            return None
+        params["workflow_ids"] = workflow_ids
+
+    return params
+
+
+async def _iter_runs(
+    hatchet: Hatchet,
+    page_size: int = 100,
+    max_runs: int | None = None,
+    **params: Any,
+) -> AsyncIterator[dict]:
+    """
+    Yield serialized runs page by page so callers can stop at any point.
+
+    Requests never ask for more rows than max_runs still allows.
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+    if max_runs is not None and max_runs < 1:
+        raise ValueError("max_runs must be at least 1")
+
+    offset = 0
+    remaining = max_runs
+    while remaining is None or remaining > 0:
+        limit = page_size if remaining is None else min(page_size, remaining)
+        page = await hatchet.runs.aio_list(**params, limit=limit, offset=offset)
+        rows = page.rows
+        # Drop the response object so only the current rows stay alive
+        page = None
+        for r in rows:
+            yield _serialize_run(r)
+        if len(rows) < limit:
+            break
+        offset += limit
+        if remaining is not None:
+            remaining -= limit
+
+
+# Identical read-only tool calls within this window, including concurrent
+# ones, share a single request to Hatchet.
+_TOOL_CACHE_TTL = 5
+
+
+@alru_cache(maxsize=256, ttl=_TOOL_CACHE_TTL)
+async def _cached_list_runs(
+    workflow_name: str | None,
+    status: str | None,
+    since_hours: int,
+    limit: int,
+) -> list[dict]:
+    """Fetch and serialize one page of runs for list_runs."""
+    hatchet = get_hatchet_client()
+    params = await _build_params(
+        since_hours=since_hours, limit=limit, status=status, workflow_name=workflow_name
+    )
+    if params is None:
+        return []
+    runs = await hatchet.runs.aio_list(**params)
+    serialize = _serialize_run
+    return [serialize(r) for r in runs.rows]
+
+
+@alru_cache(maxsize=256, ttl=_TOOL_CACHE_TTL)
+async def _cached_run_status(run_id: str) -> dict:
+    """Fetch and serialize a single run for get_run_status."""
+    hatchet = get_hatchet_client()
+    details = await hatchet.runs.aio_get(run_id)
+    return _serialize_run(details.run)
+
+
+# Upper bound on concurrent per-key metadata queries in search_runs
+_SEARCH_CONCURRENCY = 10
+
+# Pages fetched per metadata key before search_runs gives up
+_SEARCH_MAX_PAGES = 20
+
+
+def _matches_metadata(run: Any, pairs: tuple[tuple[str, str], ...]) -> bool:
+    """
+    Check whether a run's additional_metadata contains every pair.
+
+    Non-string values are compared by their JSON encoding, as the Hatchet API
+    does, so a stored True matches 'true' and 3 matches '3'.
+    """
+    metadata = run.additional_metadata or {}
+    for key, value in pairs:
+        if key not in metadata:
+            return False
+        actual = metadata[key]
+        if (actual if isinstance(actual, str) else json.dumps(actual)) != value:
+            return False
+    return True
+
+
+@alru_cache(maxsize=256, ttl=_TOOL_CACHE_TTL)
+async def _cached_search_runs(
+    metadata: tuple[tuple[str, str], ...],
+    status: str | None,
+    since_hours: int,
+    limit: int,
+) -> list[dict]:
+    """
+    Fetch and serialize runs matching every metadata pair for search_runs.
+
+    A single pair is passed straight to the API filter. With several pairs,
+    each is queried in parallel, page by page, and the rows carrying all
+    pairs are kept. A run matching every pair appears in each key's results,
+    so paging stops once any key is exhausted or enough runs have matched.
+    """
+    if not metadata:
+        raise ValueError("metadata must contain at least one key-value pair")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+
+    hatchet = get_hatchet_client()
+    serialize = _serialize_run
+    if len(metadata) == 1:
+        # The server's filter is the whole match, so no client-side check
+        params = await _build_params(
+            since_hours=since_hours, limit=limit, status=status, metadata=dict(metadata)
+        )
+        runs = await hatchet.runs.aio_list(**params)
+        return [serialize(r) for r in runs.rows]
+
+    params = await _build_params(since_hours=since_hours, status=status)
+    semaphore = asyncio.Semaphore(_SEARCH_CONCURRENCY)
+    # Rows already match the pair their page was queried with; only the
+    # remaining pairs need checking locally.
+    other_pairs = [tuple(p for p in metadata if p != pair) for pair in metadata]
+
+    async def fetch(key: str, value: str, offset: int) -> list[Any]:
+        async with semaphore:
+            page = await hatchet.runs.aio_list(
+                **params, limit=limit, offset=offset, additional_metadata={key: value}
+            )
+        return page.rows
+
+    matches: dict[str, Any] = {}
+    offset = 0
+    for _ in range(_SEARCH_MAX_PAGES):
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(fetch(k, v, offset)) for k, v in metadata]
+        except ExceptionGroup as eg:
+            # Surface the underlying error rather than the group wrapper
+            raise eg.exceptions[0] from eg
+
+        pages = [t.result() for t in tasks]
+        for rows, others in zip(pages, other_pairs):
+            for r in rows:
+                if _matches_metadata(r, others):
+                    matches.setdefault(r.metadata.id, r)
+
+        if len(matches) >= limit or any(len(rows) < limit for rows in pages):
+            break
+        offset += limit
+
+    newest_first = sorted(matches.values(), key=lambda r: r.created_at, reverse=True)
+    return [serialize(r) for r in newest_first[:limit]]
+
+
 @mcp.tool()
 async def list_workflows() -> list[dict]:
     """
@@ -72,9 +414,7 @@ async def list_workflows() -> list[dict]:
     Returns a list of workflows with their IDs, names, and descriptions.
     """
     try:
-        hatchet = get_hatchet_client()
-        workflows = await hatchet.workflows.aio_list()
-        return [_serialize_workflow(w) for w in (workflows.rows or [])]
+        return (await _get_workflow_catalog()).workflows
     except Exception as e:
         return [{"error": str(e)}]
 
@@ -98,30 +438,48 @@ async def list_runs(
     Returns a list of runs with their status, metadata, and timing info.
     """
     try:
-        hatchet = get_hatchet_client()
-        # Build filter parameters
-        params: dict[str, Any] = {
-            "since": datetime.now(tz=timezone.utc) - timedelta(hours=since_hours),
-            "limit": limit,
-        }
+        return await _cached_list_runs(workflow_name, status, since_hours, limit)
+    except Exception as e:
+        return [{"error": str(e)}]
 
-        if status and status.lower() in STATUS_MAP:
-            params["statuses"] = [STATUS_MAP[status.lower()]]
 
-        if workflow_name:
-            # Need to get workflow ID from name
-            workflows = await hatchet.workflows.aio_list()
-            workflow_ids = [
-                w.metadata.id for w in (workflows.rows or [])
-                if hasattr(w, "name") and w.name == workflow_name
-            ]
-            if workflow_ids:
-                params["workflow_ids"] = workflow_ids
+@mcp.tool()
+async def list_runs_stream(
+    workflow_name: str | None = None,
+    status: str | None = None,
+    since_hours: int = 24,
+    max_runs: int = 1000,
+    page_size: int = 100,
+) -> list[dict]:
+    """
+    List workflow runs across multiple pages, for queries larger than list_runs.
 
-        runs = await hatchet.runs.aio_list(**params)
-        return [_serialize_run(r) for r in (runs.rows or [])]
+    Args:
+        workflow_name: Filter by workflow name (e.g., 'qa-workflow', 'embed-workflow')
+        status: Filter by status ('queued', 'running', 'completed', 'failed', 'cancelled')
+        since_hours: How many hours back to search (default: 24)
+        max_runs: Maximum number of runs to return (default: 1000)
+        page_size: Number of runs fetched per request (default: 100)
+
+    Returns a list of runs. If a page fails, the runs fetched so far are kept
+    and an error entry is appended.
+    """
+    runs: list[dict] = []
+    try:
+        hatchet = get_hatchet_client()
+        params = await _build_params(
+            since_hours=since_hours, status=status, workflow_name=workflow_name
+        )
+        if params is None:
+            return runs
+
+        pages = _iter_runs(hatchet, page_size=page_size, max_runs=max_runs, **params)
+        async with aclosing(pages):
+            async for run in pages:
+                runs.append(run)
     except Exception as e:
-        return [{"error": str(e)}]
+        runs.append({"error": str(e)})
+    return runs
 
 
 @mcp.tool()
@@ -135,9 +493,7 @@ async def get_run_status(run_id: str) -> dict:
     Returns the run's current status and details.
     """
     try:
-        hatchet = get_hatchet_client()
-        status = await hatchet.runs.aio_get(run_id)
-        return _serialize_run(status)
+        return await _cached_run_status(run_id)
     except Exception as e:
         return {"error": str(e), "run_id": run_id}
 
@@ -163,48 +519,31 @@ async def get_run_result(run_id: str) -> dict:
 @mcp.tool()
 async def get_queue_metrics(workflow_name: str | None = None) -> dict:
     """
-    Get queue depth and job counts by status.
+    Get queue depth and task counts by status over the last 24 hours.
+
+    Counts are per task, not per workflow run, so a run with several tasks
+    is counted once for each of its tasks.
 
     Args:
         workflow_name: Optional workflow name to filter metrics
 
-    Returns counts of jobs in each status (queued, running, completed, failed).
+    Returns counts of tasks in each status (queued, running, completed, failed, cancelled).
     """
     try:
         hatchet = get_hatchet_client()
-        # Get runs from the last 24 hours and count by status
-        params: dict[str, Any] = {
-            "since": datetime.now(tz=timezone.utc) - timedelta(hours=24),
-            "limit": 1000,
-        }
-
-        if workflow_name:
-            workflows = await hatchet.workflows.aio_list()
-            workflow_ids = [
-                w.metadata.id for w in (workflows.rows or [])
-                if hasattr(w, "name") and w.name == workflow_name
-            ]
-            if workflow_ids:
-                params["workflow_ids"] = workflow_ids
-
-        runs = await hatchet.runs.aio_list(**params)
-
-        # Count by status
-        counts = {
-            "queued": 0,
-            "running": 0,
-            "completed": 0,
-            "failed": 0,
-            "cancelled": 0,
-            "total": 0,
-        }
-
-        for run in (runs.rows or []):
-            counts["total"] += 1
-            if hasattr(run, "status"):
-                status_name = run.status.value.lower() if hasattr(run.status, "value") else str(run.status).lower()
-                if status_name in counts:
-                    counts[status_name] += 1
+        params = await _build_params(since_hours=24, workflow_name=workflow_name)
+
+        if params is None:
+            # Unknown workflow name: nothing can match, so skip the query
+            counts = dict.fromkeys(_STATUS_NAMES, 0)
+        else:
+            # Let the metrics endpoint group counts by status in one call
+            task_metrics = await hatchet.metrics.aio_get_task_metrics(
+                since=params["since"],
+                workflow_ids=params.get("workflow_ids"),
+            )
+            counts = {name: getattr(task_metrics, name) for name in _STATUS_NAMES}
+        counts["total"] = sum(counts.values())
 
         return {
             "workflow_name": workflow_name or "all",
@@ -217,14 +556,13 @@ async def get_queue_metrics(workflow_name: str | None = None) -> dict:
 
 @mcp.tool()
 async def search_runs(
-    metadata_key: str,
-    metadata_value: str,
+    metadata: dict[str, str],
     status: str | None = None,
     since_hours: int = 24,
     limit: int = 50,
 ) -> list[dict]:
     """
-    Search runs by metadata key-value pairs.
+    Search runs by metadata key-value pairs. Runs must match every pair.
 
     Common metadata keys:
     - audit_id: The audit being processed
@@ -234,8 +572,7 @@ async def search_runs(
     - rule_id: Rule being processed
 
     Args:
-        metadata_key: The metadata key to search (e.g., 'audit_id')
-        metadata_value: The value to match
+        metadata: Key-value pairs to match (e.g., {'audit_id': 'abc123'})
         status: Optional status filter
         since_hours: How many hours back to search (default: 24)
         limit: Maximum runs to return (default: 50)
@@ -243,22 +580,46 @@ async def search_runs(
     Returns matching runs with their full metadata.
     """
     try:
-        hatchet = get_hatchet_client()
-        params: dict[str, Any] = {
-            "since": datetime.now(tz=timezone.utc) - timedelta(hours=since_hours),
-            "limit": limit,
-            "additional_metadata": {metadata_key: metadata_value},
-        }
-
-        if status and status.lower() in STATUS_MAP:
-            params["statuses"] = [STATUS_MAP[status.lower()]]
-
-        runs = await hatchet.runs.aio_list(**params)
-        return [_serialize_run(r) for r in (runs.rows or [])]
+        return await _cached_search_runs(
+            tuple(sorted(metadata.items())), status, since_hours, limit
+        )
     except Exception as e:
         return [{"error": str(e)}]
 
 
+def _clear_caches() -> None:
+    """Drop every cached Hatchet response, including the workflow catalog."""
+    _get_workflow_catalog.cache_clear()
+    _cached_list_runs.cache_clear()
+    _cached_run_status.cache_clear()
+    _cached_search_runs.cache_clear()
+
+
+# How often the background sweeper drops all cached responses
+_CACHE_SWEEP_INTERVAL = 300
+
+
+async def _cache_sweeper() -> None:
+    """Periodically clear caches so renamed or deleted workflows drop out."""
+    while True:
+        await asyncio.sleep(_CACHE_SWEEP_INTERVAL)
+        _clear_caches()
+
+
+@mcp.tool()
+async def refresh_cache() -> dict:
+    """
+    Clear cached results so the next calls fetch fresh data from Hatchet.
+
+    Use this after renaming or deleting workflows if workflow_name filters
+    return stale results.
+
+    Returns confirmation that the caches were cleared.
+    """
+    _clear_caches()
+    return {"cleared": True}
+
+
 def main():
     """Run the MCP server."""
     mcp.run(transport="stdio")